@@ -2,50 +2,183 @@
 
 import os
 import sys
-import json
+import hashlib
+import functools
+import itertools
+import threading
+import contextlib
+import multiprocessing
 from dotenv import load_dotenv
+import orjson
+import diskcache
+import numpy as np
+import torch
 import chromadb
+from sentence_transformers import SentenceTransformer
 from chromadb.utils import embedding_functions # Import for ChromaDB's embedding function integration
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+import docx # python-docx, for structure-aware .docx loading
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+import openpyxl # For structure-aware .xlsx loading
+from langchain_core.documents import Document
 from langchain_community.document_loaders import (
     PyPDFLoader,
     CSVLoader,
-    UnstructuredWordDocumentLoader, # Handles .doc and .docx
-    TextLoader,
-    UnstructuredExcelLoader # For .xlsx files
+    UnstructuredWordDocumentLoader, # Handles legacy .doc
+    TextLoader
 )
 # from langchain_google_genai import GoogleGenerativeAIEmbeddings # Uncomment for Gemini Embeddings
 # from langchain_community.embeddings import SentenceTransformerEmbeddings # Not directly used with Chroma's embedding_function setup
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from text_chunkers import NUMBA_AVAILABLE
+from document_splitter import split_document
 
 # Load environment variables from .env file
 load_dotenv()
 
 # --- Configuration ---
+# Use every core for CPU inference; torch defaults to a more conservative thread count
+torch.set_num_threads(os.cpu_count() or 1)
+
 # ChromaDB client setup
-# Using PersistentClient for local storage. Data will be saved in './chroma_db' folder.
-# For production, consider chromadb.HttpClient to connect to a separate ChromaDB server.
+# With CHROMA_SERVER_HOST set, connect to a shared `chroma run` server: every worker process then uses the
+# same in-memory HNSW index and no process contends for the SQLite write lock.
+# Otherwise fall back to PersistentClient for local storage. Data will be saved in './chroma_db' folder.
+CHROMA_SERVER_HOST = os.getenv("CHROMA_SERVER_HOST")
+CHROMA_SERVER_PORT = int(os.getenv("CHROMA_SERVER_PORT", 8000))
 try:
-    client = chromadb.PersistentClient(path="./chroma_db")
+    if CHROMA_SERVER_HOST:
+        client = chromadb.HttpClient(host=CHROMA_SERVER_HOST, port=CHROMA_SERVER_PORT)
+    else:
+        client = chromadb.PersistentClient(path="./chroma_db")
 except Exception as e:
-    print(f"Error initializing ChromaDB PersistentClient: {e}", file=sys.stderr)
+    print(f"Error initializing ChromaDB client: {e}", file=sys.stderr)
     sys.exit(1)
 
 COLLECTION_NAME = "cortexhub_documents"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+# Chunks are embedded and inserted in batches of this size while the file is still being parsed,
+# bounding peak memory on large files (and staying far below Chroma's max add() batch size)
+INGEST_BATCH_SIZE = 256
+# HNSW index parameters, applied when the collection is first created (an existing collection keeps its own).
+# Higher M and construction_ef buy recall at the cost of graph memory and build time;
+# search_ef sets the recall/latency trade-off at query time.
+HNSW_METADATA = {
+    # Every embedding is L2-normalized, so inner product ranks exactly like cosine while skipping
+    # hnswlib's per-vector normalization on insert and query
+    "hnsw:space": "ip",
+    "hnsw:M": int(os.getenv("HNSW_M", 32)),
+    "hnsw:construction_ef": int(os.getenv("HNSW_CONSTRUCTION_EF", 200)),
+    "hnsw:search_ef": int(os.getenv("HNSW_SEARCH_EF", 64)),
+    "hnsw:num_threads": os.cpu_count() or 1,
+}
+# Directory produced by export_onnx_model.py; when present, the int8 ONNX model replaces the PyTorch one
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_model")
+ONNX_MODEL_FILE = "model_quantized.onnx"
+
+# Persistent content-hash -> embedding cache so re-ingesting identical chunks skips the encoder.
+# Entries are stored as float16 (half the disk and I/O; normalized MiniLM vectors lose no measurable recall)
+embedding_cache = diskcache.Cache(os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache"))
+
+# Number of worker processes used to chunk loaded documents in parallel.
+# Loading stays serial (one pass over the file); only the CPU-bound splitting is fanned out.
+LOAD_DOCUMENTS_NUM_WORKERS = int(os.getenv("LOAD_DOCUMENTS_NUM_WORKERS", max((os.cpu_count() or 1) - 1, 1)))
+# Loaded units handed to the pool at a time; bounds how far loading can run ahead of embedding
+SPLIT_WINDOW_SIZE = LOAD_DOCUMENTS_NUM_WORKERS * 8
+# Chunking strategy: "recursive" (LangChain RecursiveCharacterTextSplitter), "binary" (text_chunkers.binary_split_text)
+# or "numba" (text_chunkers.fast_split_text). When unset, the Numba chunker handles plain text, CSV and PDF
+# text if numba is installed, and LangChain handles everything else.
+SPLITTER = os.getenv("SPLITTER")
+FAST_SPLIT_FILE_TYPES = {'text/plain', 'text/csv', 'application/pdf'}
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+class OnnxEmbeddingFunction(EmbeddingFunction):
+    """Runs the int8-quantized MiniLM export on ONNX Runtime (CPU), mean-pooled and L2-normalized."""
+
+    def __init__(self, model_dir: str, batch_size: int = EMBEDDING_BATCH_SIZE, max_length: int = 256):
+        # Imported lazily so the PyTorch-only setup does not need onnxruntime installed
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE),
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.batch_size = batch_size
+        self.max_length = max_length # Matches the SentenceTransformer max_seq_length for this model
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Encodes texts batch by batch; each batch is padded only to its own longest text."""
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            inputs = {name: value for name, value in encoded.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real tokens only, then L2 normalization
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled)
+        return np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.encode(list(input)).tolist()
+
+class LocalSentenceTransformerEmbeddingFunction(EmbeddingFunction):
+    """Wraps one SentenceTransformer instance, shared by collection queries and bulk ingestion."""
+
+    def __init__(self, model_name: str, batch_size: int = EMBEDDING_BATCH_SIZE):
+        # This automatically downloads the model the first time it's used
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Encodes texts into L2-normalized embeddings."""
+        # Half precision on GPU roughly doubles throughput; CPU stays in FP32
+        autocast = torch.amp.autocast("cuda", dtype=torch.float16) if torch.cuda.is_available() else contextlib.nullcontext()
+        with torch.inference_mode(), autocast:
+            return self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self.encode(list(input)).tolist()
 
 # Choose your embedding function for ChromaDB
-# Option 1: Use SentenceTransformer (local, default)
+# Option 1: Use the int8-quantized ONNX export if it has been generated (fastest on CPU)
+# Option 2: Fall back to SentenceTransformer (local, default)
+# Either way the model is loaded once per process and serves both queries and bulk ingestion
 try:
-    # This automatically downloads the model the first time it's used
-    default_embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
-    print("Using SentenceTransformerEmbeddingFunction.", file=sys.stderr)
+    if os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)):
+        default_embedding_function = OnnxEmbeddingFunction(ONNX_MODEL_DIR)
+        embedding_backend = f"{EMBEDDING_MODEL_NAME}-onnx-int8"
+        print("Using quantized ONNX embedding function.", file=sys.stderr)
+    else:
+        default_embedding_function = LocalSentenceTransformerEmbeddingFunction(EMBEDDING_MODEL_NAME)
+        embedding_backend = EMBEDDING_MODEL_NAME
+        print("Using SentenceTransformer embedding function.", file=sys.stderr)
 except Exception as e:
-    print(f"Error initializing SentenceTransformerEmbeddingFunction: {e}", file=sys.stderr)
-    print("Ensure 'sentence-transformers' is installed and model can be downloaded.", file=sys.stderr)
+    print(f"Error initializing embedding function: {e}", file=sys.stderr)
+    print("Ensure 'sentence-transformers' (or 'onnxruntime' for the ONNX model) is installed and the model can be loaded.", file=sys.stderr)
     sys.exit(1)
 
-# Option 2: Use Google Gemini Embeddings (requires API key)
+# Option 3: Use Google Gemini Embeddings (requires API key)
 # Uncomment the following lines if you want to use Gemini embeddings
 # GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # if not GEMINI_API_KEY:
@@ -60,21 +193,36 @@ except Exception as e:
 
 # --- Functions for Document Processing and RAG ---
 
+# The collection handle is reused for the life of the process instead of being re-fetched per call
+_collection = None
+_collection_lock = threading.Lock()
+
 def get_or_create_collection():
+    """Returns the cached ChromaDB collection, fetching or creating it on first use."""
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                _collection = _load_collection()
+    return _collection
+
+def _load_collection():
     """Gets or creates a ChromaDB collection, handling embedding function conflicts."""
     try:
-        # First, try to get existing collection without specifying embedding function
+        # First, try to get the existing collection. Queries are embedded by us (see query_documents), but attach
+        # our embedding function anyway so nothing falls back to Chroma's built-in model
         try:
-            collection = client.get_collection(name=COLLECTION_NAME)
+            collection = client.get_collection(name=COLLECTION_NAME, embedding_function=default_embedding_function)
             print(f"Found existing ChromaDB collection '{COLLECTION_NAME}'.", file=sys.stderr)
             return collection
         except Exception:
             # Collection doesn't exist, create it with our embedding function
             collection = client.create_collection(
                 name=COLLECTION_NAME,
-                embedding_function=default_embedding_function
+                embedding_function=default_embedding_function,
+                metadata=HNSW_METADATA
             )
-            print(f"Created new ChromaDB collection '{COLLECTION_NAME}' with SentenceTransformer embedding.", file=sys.stderr)
+            print(f"Created new ChromaDB collection '{COLLECTION_NAME}' with {type(default_embedding_function).__name__}.", file=sys.stderr)
             return collection
             
     except Exception as e:
@@ -85,28 +233,94 @@ def get_or_create_collection():
                 client.delete_collection(name=COLLECTION_NAME)
                 collection = client.create_collection(
                     name=COLLECTION_NAME,
-                    embedding_function=default_embedding_function
+                    embedding_function=default_embedding_function,
+                    metadata=HNSW_METADATA
                 )
                 print(f"Successfully recreated ChromaDB collection '{COLLECTION_NAME}'.", file=sys.stderr)
                 return collection
             except Exception as recreate_error:
                 print(f"Error recreating collection: {recreate_error}", file=sys.stderr)
-                sys.exit(1)
+                raise
         else:
             print(f"Error with ChromaDB collection: {e}", file=sys.stderr)
-            sys.exit(1)
+            raise
+
+def _resolve_splitter(file_type: str) -> str:
+    """Picks the chunking strategy for a file type (see SPLITTER)."""
+    if SPLITTER:
+        return SPLITTER
+    return "numba" if NUMBA_AVAILABLE and file_type in FAST_SPLIT_FILE_TYPES else "recursive"
+
+# One chunking pool per process, created on first use and reused by every later document
+_split_pool = None
+_split_pool_lock = threading.Lock()
+
+def _get_split_pool():
+    """Returns the process-wide chunking pool, starting it on first use."""
+    global _split_pool
+    if _split_pool is None:
+        with _split_pool_lock:
+            if _split_pool is None:
+                # Never plain fork: this process runs server and torch threads. A fork server is started once
+                # from a clean interpreter with the splitter preloaded, and workers are forked from it. Each
+                # worker still re-imports the main script as __mp_main__, which is why python_worker.py keeps
+                # its imports lazy and the pool is never used when this module is __main__
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload(["document_splitter"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                _split_pool = context.Pool(LOAD_DOCUMENTS_NUM_WORKERS)
+    return _split_pool
+
+def _load_docx(file_path: str):
+    """Reads a .docx natively, one Document per non-empty paragraph or table row, in reading order."""
+    word_document = docx.Document(file_path)
+    documents = []
+    para = table = 0
+    # Walk the body's children in order; .paragraphs and .tables would lose where each table sits
+    for element in word_document.element.body.iterchildren():
+        if element.tag == qn("w:p"):
+            text = Paragraph(element, word_document).text.strip()
+            if text:
+                documents.append(Document(page_content=text, metadata={"para": para}))
+            para += 1
+        elif element.tag == qn("w:tbl"):
+            for r, row in enumerate(Table(element, word_document).rows):
+                text = " | ".join(cell.text.strip() for cell in row.cells if cell.text.strip())
+                if text:
+                    documents.append(Document(page_content=text, metadata={"table": table, "row": r}))
+            table += 1
+    return documents
+
+def _load_xlsx(file_path: str):
+    """Reads an .xlsx natively, one Document per non-empty row of each sheet."""
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    documents = []
+    try:
+        for ws in workbook.worksheets:
+            for r, row in enumerate(ws.iter_rows(values_only=True), start=1):
+                text = " | ".join(str(value) for value in row if value is not None and str(value).strip())
+                if text:
+                    documents.append(Document(page_content=text, metadata={"sheet": ws.title, "row": r}))
+    finally:
+        workbook.close() # read_only workbooks keep the file handle open until closed
+    return documents
 
-def load_and_chunk_document(file_path: str, file_type: str):
-    """Loads and chunks a document based on its type."""
+def _load_documents(file_path: str, file_type: str):
+    """Returns the loaded units (pages, rows, paragraphs) of a document, lazily where the loader allows."""
     loader = None
+    documents = None
     if file_type == 'application/pdf':
         loader = PyPDFLoader(file_path)
     elif file_type == 'text/csv':
         loader = CSVLoader(file_path)
-    elif file_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword']:
-        loader = UnstructuredWordDocumentLoader(file_path) # Handles .doc and .docx
+    elif file_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        documents = _load_docx(file_path)
+    elif file_type == 'application/msword':
+        loader = UnstructuredWordDocumentLoader(file_path) # python-docx cannot read the legacy binary format
     elif file_type in ['application/vnd.openxmlformats-officedocument.spreadsheetml.sheet']:
-        loader = UnstructuredExcelLoader(file_path) # Handles .xlsx
+        documents = _load_xlsx(file_path)
     elif file_type == 'text/plain':
         loader = TextLoader(file_path)
     else:
@@ -120,103 +334,215 @@ def load_and_chunk_document(file_path: str, file_type: str):
             print("UnstructuredFileLoader not available. Please install 'unstructured' and its dependencies for broader file support.", file=sys.stderr)
             raise ValueError(f"Unsupported file type: {file_type}. Install 'unstructured' for more formats.")
 
-    if not loader:
-        raise ValueError(f"No suitable loader found for file type: {file_type}")
+    if documents is None:
+        if not loader:
+            raise ValueError(f"No suitable loader found for file type: {file_type}")
+        documents = loader.lazy_load() # Yields pages/rows as they are parsed instead of the whole file at once
+    return documents
 
-    documents = loader.load()
-    
-    if not documents:
-        print(f"Loader returned no documents for {file_path}. File might be empty or unreadable.", file=sys.stderr)
-        return []
+def _iter_split_chunks(documents, splitter: str):
+    """Splits loaded units into chunks, in parallel worker processes when there is more than one unit."""
+    split_one = functools.partial(split_document, splitter=splitter, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    documents = iter(documents)
+    # Run as a CLI script, this module is __main__, and every pool worker would re-import it as __mp_main__:
+    # torch, the embedding model, the Chroma client and the cache, once per worker. Split serially there instead
+    if LOAD_DOCUMENTS_NUM_WORKERS <= 1 or __name__ == "__main__":
+        for document in documents:
+            yield from split_one(document)
+        return
+
+    # Units are read and split one window at a time (the loader is only advanced when the consumer
+    # asks for more chunks), so at most SPLIT_WINDOW_SIZE units and their chunks are in memory
+    while window := list(itertools.islice(documents, SPLIT_WINDOW_SIZE)):
+        if len(window) == 1:
+            yield from split_one(window[0]) # Not worth the round trip to the pool
+            continue
+        for unit_chunks in _get_split_pool().map(split_one, window):
+            yield from unit_chunks
+
+def _iter_chunks(file_path: str, file_type: str, document_id: str):
+    """Streams (id, text, metadata) tuples for every chunk of a document, ready for collection.add."""
+    base_metadata = {
+        "document_id": str(document_id), # Always a string so document_id filters match consistently
+        "filename": os.path.basename(file_path),
+        "file_type": file_type,
+    }
+    # Loader metadata keys Chroma can store (scalars only, e.g. the PDF page number), computed once per
+    # distinct key layout instead of type-checking every value of every chunk
+    allowlists = {}
+    # closing() releases the loader as soon as this stream is closed, even if it stops mid-document
+    with contextlib.closing(_iter_split_chunks(_load_documents(file_path, file_type), _resolve_splitter(file_type))) as chunks:
+        for i, chunk in enumerate(chunks):
+            layout = tuple(chunk.metadata)
+            allowed = allowlists.get(layout)
+            if allowed is None:
+                allowed = allowlists[layout] = [
+                    key for key, value in chunk.metadata.items()
+                    if key not in base_metadata and key != "chunk_index" and isinstance(value, (str, int, float, bool))
+                ]
+
+            chunk_metadata = dict(base_metadata, chunk_index=i)
+            for key in allowed:
+                chunk_metadata[key] = chunk.metadata[key]
+
+            yield f"{document_id}-{i}", chunk.page_content, chunk_metadata
+
+def embed_texts(texts: list[str]):
+    """Encodes all texts in batched forward passes and returns a (len(texts), dim) numpy array."""
+    # Smart batching: encode in length order so each mini-batch pads to a similar length,
+    # then scatter the rows back into the caller's order
+    order = np.argsort([len(text) for text in texts])
+    sorted_texts = [texts[i] for i in order]
+
+    sorted_embeddings = default_embedding_function.encode(sorted_texts)
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = text_splitter.split_documents(documents)
-    return chunks
+    embeddings = np.empty_like(sorted_embeddings)
+    embeddings[order] = sorted_embeddings
+    return embeddings
+
+def embed_texts_cached(texts: list[str]):
+    """Like embed_texts, but only encodes chunks whose content hash is not in the embedding cache."""
+    # Keys are namespaced by backend so FP32 and int8 vectors never mix
+    keys = [f"{embedding_backend}:{hashlib.blake2b(text.encode(), digest_size=16).hexdigest()}" for text in texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+
+    # Encode each missing text once, even if it repeats within the document
+    missing = {}
+    for i, embedding in enumerate(embeddings):
+        if embedding is None:
+            missing.setdefault(keys[i], []).append(i)
+
+    if missing:
+        new_embeddings = embed_texts([texts[indices[0]] for indices in missing.values()])
+        with embedding_cache.transact():
+            for (key, indices), embedding in zip(missing.items(), new_embeddings):
+                embedding_cache.set(key, embedding.astype(np.float16))
+                for i in indices:
+                    embeddings[i] = embedding
+
+    print(f"Embedding cache: {len(texts) - sum(map(len, missing.values()))}/{len(texts)} chunks reused.", file=sys.stderr)
+
+    # Chroma's HNSW index only stores float32, so hand it float32 regardless of cache precision
+    return np.stack(embeddings).astype(np.float32, copy=False)
 
 def embed_and_store_document(file_path: str, file_type: str, document_id: str):
     """Embeds document chunks and stores them in ChromaDB."""
     try:
-        chunks = load_and_chunk_document(file_path, file_type)
-        if not chunks:
-            print("No chunks found after loading and splitting document. Skipping embedding.", file=sys.stderr)
-            return None
-
         collection = get_or_create_collection()
 
-        ids = []
-        texts = []
-        metadatas = []
+        # Parse, embed and insert batch by batch; each batch is released before the next one is built.
+        # The stream is closed on the way out, so a failed embed/add also stops the loader immediately
+        total_chunks = 0
+        with contextlib.closing(_iter_chunks(file_path, file_type, document_id)) as chunk_stream:
+            while batch := list(itertools.islice(chunk_stream, INGEST_BATCH_SIZE)):
+                ids, texts, metadatas = map(list, zip(*batch))
+                # Hand pre-computed vectors to ChromaDB, bypassing its per-add embedding function
+                embeddings = embed_texts_cached(texts)
+                collection.add(
+                    embeddings=embeddings.tolist(),
+                    documents=texts,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                total_chunks += len(batch)
+
+        if not total_chunks:
+            print("No chunks found after loading and splitting document. Skipping embedding.", file=sys.stderr)
+            return None
 
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{document_id}-{i}"
-            ids.append(chunk_id)
-            texts.append(chunk.page_content)
-            
-            chunk_metadata = {
-                "document_id": document_id,
-                "filename": os.path.basename(file_path),
-                "chunk_index": i,
-                "file_type": file_type,
-            }
-            # Add page number for PDFs if available
-            if file_type == 'application/pdf' and 'page' in chunk.metadata:
-                chunk_metadata["page"] = chunk.metadata["page"]
-            
-            # Add other relevant metadata from LangChain loader if present
-            for key, value in chunk.metadata.items():
-                if key not in chunk_metadata and isinstance(value, (str, int, float, bool)):
-                    chunk_metadata[key] = value
-
-            metadatas.append(chunk_metadata)
-
-        # Add documents to ChromaDB. Embeddings are generated by the collection's embedding_function.
-        collection.add(
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
-        print(f"Successfully embedded and stored {len(chunks)} chunks for document ID: {document_id}", file=sys.stderr)
+        print(f"Successfully embedded and stored {total_chunks} chunks for document ID: {document_id}", file=sys.stderr)
         return document_id
     except Exception as e:
         print(f"Error in embed_and_store_document: {e}", file=sys.stderr)
+        # Batches inserted before the failure would otherwise leave a partially indexed document behind
+        try:
+            get_or_create_collection().delete(where={"document_id": document_id})
+        except Exception as cleanup_error:
+            print(f"Error removing partially stored chunks: {cleanup_error}", file=sys.stderr)
         # FIX: Clean up the uploaded file if processing failed
         if os.path.exists(file_path):
             os.remove(file_path)
             print(f"Cleaned up temporary file: {file_path}", file=sys.stderr)
-        sys.exit(1)
+        # Raise instead of exiting so a long-lived worker (python_worker.py) survives failed requests
+        raise
+
+def _where_for(document_ids: list[str]):
+    """Builds the metadata filter restricting a query to the given documents."""
+    # No filter at all when unrestricted (an empty dict is rejected by newer Chroma versions), and a plain
+    # equality for a single document, which Chroma resolves with one indexed metadata lookup
+    if not document_ids:
+        return None
+    if len(document_ids) == 1:
+        return {"document_id": str(document_ids[0])}
+    return {"document_id": {"$in": [str(document_id) for document_id in document_ids]}}
+
+def _format_results(documents: list[str], metadatas: list[dict]):
+    """Pairs each retrieved chunk with a human-readable source (filename and page)."""
+    formatted_results = []
+    for doc_content, metadata in zip(documents or [], metadatas or []):
+        source_info = metadata.get('filename', 'Unknown Source')
+        if 'page' in metadata:
+            source_info += f" (Page {metadata['page']})"
+
+        formatted_results.append({
+            "text": doc_content,
+            "source": source_info
+        })
+    return formatted_results
 
 def query_documents(query_text: str, document_ids: list[str], k: int = 4):
     """Queries ChromaDB for relevant chunks and returns their content and source metadata."""
     try:
         collection = get_or_create_collection()
-        
-        where_clause = {"document_id": {"$in": document_ids}} if document_ids else {}
 
-        # CRITICAL FIX: query_texts expects a list, and embeddings are generated by collection's function
+        # Embed the query with the same model that embedded the stored chunks (int8 ONNX or local
+        # SentenceTransformer) rather than whatever embedding function the collection handle carries
         results = collection.query(
-            query_texts=[query_text], # Pass query text directly, collection uses its embedding function
+            query_embeddings=embed_texts([query_text]).tolist(),
             n_results=k,
-            where=where_clause,
+            where=_where_for(document_ids),
             include=['documents', 'metadatas']
         )
         
         # FIX: Format results to include text content and source information
-        formatted_results = []
         if results['documents'] and results['documents'][0]:
-            for i, doc_content in enumerate(results['documents'][0]):
-                metadata = results['metadatas'][0][i]
-                source_info = metadata.get('filename', 'Unknown Source')
-                if 'page' in metadata:
-                    source_info += f" (Page {metadata['page']})"
-                
-                formatted_results.append({
-                    "text": doc_content,
-                    "source": source_info
-                })
-        return formatted_results
+            return _format_results(results['documents'][0], results['metadatas'][0])
+        return []
     except Exception as e:
         print(f"Error in query_documents: {e}", file=sys.stderr)
-        sys.exit(1)
+        raise
+
+def query_documents_batch(queries: list[dict], k: int = 4):
+    """Answers many {query, document_ids, k} items, returning one result list per item in input order."""
+    if not queries:
+        return []
+    try:
+        collection = get_or_create_collection()
+
+        # Queries sharing the same filter and k go to Chroma together: one index lookup per group
+        groups = {}
+        for position, item in enumerate(queries):
+            document_ids = tuple(sorted(item.get("document_ids") or []))
+            # A missing or null per-item k falls back to the default, as the worker does via exclude_none
+            groups.setdefault((document_ids, int(item.get("k") or k)), []).append(position)
+
+        # Every query is encoded in one batch up front, with the model used at ingestion
+        query_embeddings = embed_texts([item["query"] for item in queries])
+
+        batch_results = [[] for _ in queries]
+        for (document_ids, group_k), positions in groups.items():
+            results = collection.query(
+                query_embeddings=query_embeddings[positions].tolist(),
+                n_results=group_k,
+                where=_where_for(list(document_ids)),
+                include=['documents', 'metadatas']
+            )
+            for row, position in enumerate(positions):
+                batch_results[position] = _format_results(results['documents'][row], results['metadatas'][row])
+        return batch_results
+    except Exception as e:
+        print(f"Error in query_documents_batch: {e}", file=sys.stderr)
+        raise
 
 # --- Main execution block for when script is called by Node.js ---
 if __name__ == "__main__":
@@ -245,15 +571,28 @@ if __name__ == "__main__":
         # document_ids are passed as a comma-separated string, parse it
         document_ids_str = sys.argv[3]
         document_ids = document_ids_str.split(',') if document_ids_str else []
+        k = int(sys.argv[4]) if len(sys.argv) > 4 else 4
         
         try:
-            relevant_chunks_with_sources = query_documents(query_text, document_ids)
+            relevant_chunks_with_sources = query_documents(query_text, document_ids, k)
             # Output relevant chunks as JSON for Node.js to parse
-            print(json.dumps(relevant_chunks_with_sources)) # Only JSON goes to stdout
+            sys.stdout.buffer.write(orjson.dumps(relevant_chunks_with_sources) + b"\n") # Only JSON goes to stdout
         except Exception as e:
             print(f"FAILURE:Query process failed: {e}", file=sys.stderr)
             sys.exit(1)
 
+    elif operation == "query_documents_batch":
+        # queries are passed as a JSON list of {"query", "document_ids", "k"} objects; k on argv is the default
+        queries = orjson.loads(sys.argv[2])
+        k = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+        try:
+            batch_results = query_documents_batch(queries, k)
+            sys.stdout.buffer.write(orjson.dumps(batch_results) + b"\n") # One result list per query, in input order
+        except Exception as e:
+            print(f"FAILURE:Batch query process failed: {e}", file=sys.stderr)
+            sys.exit(1)
+
     else:
         print(f"Unknown operation: {operation}", file=sys.stderr)
         sys.exit(1)
\ No newline at end of file
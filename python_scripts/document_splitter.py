@@ -0,0 +1,20 @@
+# backend/python_scripts/document_splitter.py
+
+# Per-unit splitting step run inside chroma_handler.py's chunking pool.
+# Kept in its own small module so pool workers only import the splitters, never the embedding model,
+# ChromaDB client or caches that chroma_handler.py sets up at import time.
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from text_chunkers import binary_split_text, fast_split_text
+
+def split_document(document: Document, splitter: str = "recursive", chunk_size: int = 1000, chunk_overlap: int = 200):
+    """Splits a single loaded unit (PDF page, CSV/Excel row or Word paragraph) into chunks."""
+    if splitter in ("binary", "numba"):
+        split_text = binary_split_text if splitter == "binary" else fast_split_text
+        return [
+            Document(page_content=text, metadata=dict(document.metadata))
+            for text in split_text(document.page_content, chunk_size, chunk_overlap)
+        ]
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_documents([document])
@@ -0,0 +1,39 @@
+# backend/python_scripts/export_onnx_model.py
+
+# One-time export of the embedding model to ONNX with dynamic int8 quantization.
+# chroma_handler.py picks up the result automatically from ONNX_MODEL_DIR.
+# Usage: python export_onnx_model.py [output_dir]
+
+import os
+import sys
+from dotenv import load_dotenv
+from transformers import AutoTokenizer
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+# Load environment variables from .env file
+load_dotenv()
+
+# --- Configuration ---
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_model")
+
+if __name__ == "__main__":
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else ONNX_MODEL_DIR
+
+    try:
+        # Export the FP32 PyTorch weights to ONNX and keep the tokenizer alongside
+        model = ORTModelForFeatureExtraction.from_pretrained(MODEL_ID, export=True)
+        model.save_pretrained(output_dir)
+        AutoTokenizer.from_pretrained(MODEL_ID).save_pretrained(output_dir)
+
+        # Dynamic int8 quantization; AVX-512 VNNI kernels are used where the CPU supports them
+        quantizer = ORTQuantizer.from_pretrained(model)
+        quantizer.quantize(
+            save_dir=output_dir,
+            quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        )
+        print(f"Exported quantized model to {os.path.join(output_dir, 'model_quantized.onnx')}", file=sys.stderr)
+    except Exception as e:
+        print(f"Error exporting ONNX model: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -2,7 +2,7 @@
 
 import os
 import sys
-import json
+import orjson
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from typing import List, Optional
@@ -17,9 +17,9 @@ load_dotenv()
 # --- Configuration ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# An exception (not sys.exit) lets python_worker.py fail only /generate_graph when the key is missing
 if not GEMINI_API_KEY:
-    print("GEMINI_API_KEY not found in .env.", file=sys.stderr)
-    sys.exit(1)
+    raise RuntimeError("GEMINI_API_KEY not found in .env.")
 
 # Define the models for structured output
 class Concept(BaseModel):
@@ -67,6 +67,10 @@ prompt = PromptTemplate(
 model = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=GEMINI_API_KEY, temperature=0.1)
 chain = prompt | model | parser
 
+def generate_graph(text_context: str) -> dict:
+    """Extracts a knowledge graph (concepts and relationships) from the given text."""
+    return chain.invoke({"context": text_context})
+
 # --- Main execution block for when script is called by Node.js ---
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -84,13 +88,13 @@ if __name__ == "__main__":
         
         try:
             # Invoke the chain with the provided context
-            graph = chain.invoke({"context": text_context})
+            graph = generate_graph(text_context)
             
             # Print the structured JSON result to stdout
-            print(json.dumps(graph))
+            sys.stdout.buffer.write(orjson.dumps(graph) + b"\n")
         except Exception as e:
             error_result = {"error": str(e), "message": "Failed to generate knowledge graph."}
-            print(json.dumps(error_result), file=sys.stderr)
+            print(orjson.dumps(error_result).decode(), file=sys.stderr)
             sys.exit(1)
     
     else:
@@ -2,7 +2,11 @@
 
 import os
 import sys
-import json
+import asyncio
+import sqlite3
+import threading
+import contextlib
+import orjson
 from dotenv import load_dotenv
 from typing import TypedDict, Annotated, List, Union
 from datetime import datetime
@@ -13,6 +17,7 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_community.cache import SQLiteCache
 from langgraph.graph import StateGraph, END
 
 # Load environment variables from .env file
@@ -21,62 +26,89 @@ load_dotenv()
 # --- Configuration ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+# Optional exact-match cache of Gemini responses keyed by the full prompt (system + history + input + tool
+# results), stored in the SQLite file at LLM_CACHE_PATH. Off unless set: entries never expire, so cached
+# answers to time-sensitive questions (and their web search results) would be served indefinitely.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
 
+# Raise rather than exit so python_worker.py can report the missing key on the agent routes and keep serving the rest
 if not GEMINI_API_KEY:
-    print("GEMINI_API_KEY not found in .env", file=sys.stderr)
-    sys.exit(1)
+    raise RuntimeError("GEMINI_API_KEY not found in .env")
 
 if not TAVILY_API_KEY:
-    print("TAVILY_API_KEY not found in .env", file=sys.stderr)
-    sys.exit(1)
+    raise RuntimeError("TAVILY_API_KEY not found in .env")
 
 # --- Define the Agent's Tools ---
 tavily_tool = TavilySearch(max_results=5, api_key=TAVILY_API_KEY)
 tools = [tavily_tool]
 
+def _tavily_search(query_json: bytes):
+    """Runs a Tavily search for JSON-encoded tool args."""
+    return tavily_tool.invoke(orjson.loads(query_json))
+
+def _is_search_error(output) -> bool:
+    # TavilySearch reports failures such as timeouts and rate limits as a returned {"error": ...} dict
+    return isinstance(output, dict) and "error" in output
+
+# --- Model and prompt ---
+# Built once per process: the bound model keeps its client (and open connection) across graph steps.
+# Identical prompts are answered from the response cache without calling Gemini.
+MODEL_WITH_TOOLS = ChatGoogleGenerativeAI(
+    model="gemini-2.5-pro",
+    google_api_key=GEMINI_API_KEY,
+    temperature=0,
+    cache=SQLiteCache(database_path=LLM_CACHE_PATH) if LLM_CACHE_PATH else None
+).bind_tools(tools)
+
+AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful AI assistant. You have access to a web search tool to find information. Use the chat history to maintain context across the conversation."),
+    ("placeholder", "{chat_history}"),
+    ("human", "{input}"),
+    ("placeholder", "{intermediate_steps}"),
+])
+
+AGENT_CHAIN = AGENT_PROMPT | MODEL_WITH_TOOLS
+
 # --- Define the Agent's state ---
 class AgentState(TypedDict):
     input: str
     chat_history: List[BaseMessage]
     intermediate_steps: Annotated[List[Union[AIMessage, ToolMessage]], lambda a, b: a + b] # Corrected type annotation for clarity
+    search_results: dict # Successful searches of this run, keyed by canonical tool args; filled in by call_tools
 
 # --- Define the Agent's Nodes ---
 
 def call_model(state: AgentState):
     """Called when the agent needs to decide what to do next."""
-    model_with_tools = ChatGoogleGenerativeAI(
-        model="gemini-2.5-pro",
-        google_api_key=GEMINI_API_KEY,
-        temperature=0
-    ).bind_tools(tools)
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful AI assistant. You have access to a web search tool to find information. Use the chat history to maintain context across the conversation."),
-        ("placeholder", "{chat_history}"),
-        ("human", "{input}"),
-        ("placeholder", "{intermediate_steps}"),
-    ])
-    
-    chain = prompt | model_with_tools
-    response = chain.invoke(state)
+    response = AGENT_CHAIN.invoke(state)
     return {"intermediate_steps": [response]}
 
-def call_tools(state: AgentState):
-    """Calls the tool based on the agent's decision."""
+async def call_tools(state: AgentState):
+    """Calls every tool the agent requested, concurrently."""
     last_message = state['intermediate_steps'][-1]
     
     # Check if the last message has tool calls
     if hasattr(last_message, 'tool_calls') and last_message.tool_calls:
-        # Assuming only one tool call for simplicity
-        tool_call = last_message.tool_calls[0]
-        tool_output = tavily_tool.invoke(tool_call['args'])
+        # Gemini can request several searches per step; run them in parallel so the step costs one round trip.
+        # Args are canonicalized (sorted keys) so a search repeated in this step, or earlier in the same run,
+        # is only sent once. The results live only as long as the run, so nothing stale is ever replayed.
+        tool_calls = last_message.tool_calls
+        search_results = state['search_results']
+        query_keys = [orjson.dumps(tool_call['args'], option=orjson.OPT_SORT_KEYS) for tool_call in tool_calls]
+        pending_keys = [key for key in dict.fromkeys(query_keys) if key not in search_results]
+        outputs = await asyncio.gather(*[asyncio.to_thread(_tavily_search, key) for key in pending_keys])
+        output_by_key = {key: search_results[key] for key in query_keys if key in search_results}
+        for key, output in zip(pending_keys, outputs):
+            output_by_key[key] = str(output)
+            if not _is_search_error(output): # Failed searches are retried if the agent asks again
+                search_results[key] = output_by_key[key]
         
-        # Create a tool message
-        tool_message = ToolMessage(
-            content=str(tool_output),
-            tool_call_id=tool_call['id']
-        )
-        return {"intermediate_steps": [tool_message]}
+        # Create one tool message per call, matched by id
+        tool_messages = [
+            ToolMessage(content=output_by_key[key], tool_call_id=tool_call['id'])
+            for tool_call, key in zip(tool_calls, query_keys)
+        ]
+        return {"intermediate_steps": tool_messages}
     else:
         # No tool calls, return empty
         return {"intermediate_steps": []}
@@ -112,41 +144,172 @@ workflow.add_edge("action", "agent")
 app_graph = workflow.compile()
 
 # --- History Management Functions ---
+# Chat history lives in SQLite (WAL mode), one row per message, so each turn is an append
+# rather than a rewrite of the whole session file.
+HISTORY_DB_PATH = os.getenv("CHAT_HISTORY_DB", "chat_history.db")
+
+_HISTORY_DB = sqlite3.connect(HISTORY_DB_PATH, isolation_level=None, check_same_thread=False)
+_HISTORY_DB.executescript("""
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    CREATE TABLE IF NOT EXISTS msg(session TEXT, idx INTEGER, role TEXT, content TEXT, PRIMARY KEY(session, idx));
+""")
+# The connection is shared by the worker's threads; sqlite3 connections must not be used concurrently
+_HISTORY_LOCK = threading.Lock()
+
+@contextlib.contextmanager
+def _history_transaction():
+    """Holds the connection lock and runs the block as one write transaction, rolled back if it raises."""
+    with _HISTORY_LOCK:
+        _HISTORY_DB.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            _HISTORY_DB.execute("COMMIT")
+        except BaseException:
+            _HISTORY_DB.execute("ROLLBACK")
+            raise
+
+def _insert_messages(session_id: str, messages: List[BaseMessage]):
+    """Inserts messages at the end of a session; must run inside _history_transaction."""
+    for msg in messages:
+        role = "human" if isinstance(msg, HumanMessage) else "ai" if isinstance(msg, AIMessage) else None
+        if role is None:
+            continue
+        # idx is assigned in SQL so concurrent writers cannot collide
+        _HISTORY_DB.execute(
+            "INSERT INTO msg(session, idx, role, content) "
+            "SELECT ?, COALESCE(MAX(idx) + 1, 0), ?, ? FROM msg WHERE session = ?",
+            (session_id, role, msg.content, session_id)
+        )
 
-def load_history_from_file(session_id: str) -> List[BaseMessage]:
-    """Load chat history from a JSON file"""
+def _import_legacy_history(session_id: str):
+    """Moves a pre-SQLite chat_history_<session>.json file into the database, if one exists."""
     history_file = f"chat_history_{session_id}.json"
-    if os.path.exists(history_file):
+    if not os.path.exists(history_file):
+        return
+    # Read and insert inside one transaction, which also serializes other threads and worker processes.
+    # A session that already has rows was imported by someone else, so its file is only stale.
+    with _history_transaction():
         try:
-            with open(history_file, 'r') as f:
-                history_data = json.load(f)
-                history = []
-                for msg in history_data:
-                    if msg['type'] == 'human':
-                        history.append(HumanMessage(content=msg['content']))
-                    elif msg['type'] == 'ai':
-                        history.append(AIMessage(content=msg['content']))
-                return history
-        except Exception as e:
-            print(f"Error loading history: {e}", file=sys.stderr)
+            with open(history_file, 'rb') as f:
+                history_data = orjson.loads(f.read())
+        except FileNotFoundError:
+            return
+        if _HISTORY_DB.execute("SELECT 1 FROM msg WHERE session = ? LIMIT 1", (session_id,)).fetchone() is None:
+            _insert_messages(session_id, [
+                HumanMessage(content=msg['content']) if msg['type'] == 'human' else AIMessage(content=msg['content'])
+                for msg in history_data if msg['type'] in ('human', 'ai')
+            ])
+    # Only delete the file once its messages are committed; a failed import leaves it for the next load
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(history_file)
+
+def load_history(session_id: str) -> List[BaseMessage]:
+    """Load chat history of a session from the database"""
+    try:
+        _import_legacy_history(session_id)
+        with _HISTORY_LOCK:
+            rows = _HISTORY_DB.execute(
+                "SELECT role, content FROM msg WHERE session = ? ORDER BY idx", (session_id,)
+            ).fetchall()
+        history = []
+        for role, content in rows:
+            if role == 'human':
+                history.append(HumanMessage(content=content))
+            elif role == 'ai':
+                history.append(AIMessage(content=content))
+        return history
+    except Exception as e:
+        print(f"Error loading history: {e}", file=sys.stderr)
     return []
 
-def save_history_to_file(session_id: str, history: List[BaseMessage]):
-    """Save chat history to a JSON file"""
-    history_file = f"chat_history_{session_id}.json"
+def append_history(session_id: str, messages: List[BaseMessage]):
+    """Append new messages to the chat history of a session"""
     try:
-        history_data = []
-        for msg in history:
-            if isinstance(msg, HumanMessage):
-                history_data.append({"type": "human", "content": msg.content})
-            elif isinstance(msg, AIMessage):
-                history_data.append({"type": "ai", "content": msg.content})
-        
-        with open(history_file, 'w') as f:
-            json.dump(history_data, f, indent=2)
+        # One transaction per turn
+        with _history_transaction():
+            _insert_messages(session_id, messages)
     except Exception as e:
         print(f"Error saving history: {e}", file=sys.stderr)
 
+# --- Operations (shared by the CLI below and python_worker.py) ---
+
+def run_agent(goal: str, session_id: str) -> dict:
+    """Runs the agent on a goal within a session and returns the structured log for the frontend."""
+    # Load existing chat history
+    chat_history = load_history(session_id)
+
+    # Initialize inputs with chat history and new user goal
+    inputs = {
+        "input": goal,
+        "chat_history": chat_history,
+        "intermediate_steps": [],
+        "search_results": {}
+    }
+
+    # Run the graph (async, since the tool node is a coroutine)
+    final_output = asyncio.run(app_graph.ainvoke(inputs))
+
+    # Extract the final answer
+    if final_output['intermediate_steps']:
+        final_message = final_output['intermediate_steps'][-1]
+        final_text = final_message.content if hasattr(final_message, 'content') else str(final_message)
+    else:
+        final_text = "No response generated"
+
+    # Append the new interaction to the chat history
+    new_messages = [
+        HumanMessage(content=goal),
+        AIMessage(content=final_text)
+    ]
+    append_history(session_id, new_messages)
+
+    # Create a structured log for the frontend
+    current_time = datetime.now().strftime("%H:%M:%S") # My Comment: Use Python's datetime for a timestamp
+
+    simulated_log = [
+        {"id": "log-1", "type": "goal", "text": f"Goal received: \"{goal}\"", "timestamp": current_time},
+        {"id": "log-2", "type": "status", "text": "Agent is processing...", "timestamp": current_time},
+        {"id": "log-3", "type": "result", "text": final_text, "details": "Agent execution completed", "timestamp": current_time},
+    ]
+
+    return {
+        "message": "Agent execution complete.",
+        "log": simulated_log,
+        "session_id": session_id,
+        "history_length": len(chat_history) + len(new_messages)
+    }
+
+def get_history(session_id: str) -> dict:
+    """Returns the serialized chat history of a session."""
+    history = load_history(session_id)
+
+    history_data = []
+    for msg in history:
+        if isinstance(msg, HumanMessage):
+            history_data.append({"type": "human", "content": msg.content})
+        elif isinstance(msg, AIMessage):
+            history_data.append({"type": "ai", "content": msg.content})
+
+    return {
+        "session_id": session_id,
+        "history": history_data
+    }
+
+def clear_history(session_id: str) -> dict:
+    """Deletes the stored chat history of a session."""
+    with _HISTORY_LOCK:
+        _HISTORY_DB.execute("DELETE FROM msg WHERE session = ?", (session_id,))
+
+    # Also drop a pre-SQLite history file that was never imported
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(f"chat_history_{session_id}.json")
+
+    return {
+        "message": f"History cleared for session {session_id}",
+        "session_id": session_id
+    }
+
 # --- Main execution block ---
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -164,59 +327,15 @@ if __name__ == "__main__":
         session_id = sys.argv[3]
         
         try:
-            # Load existing chat history
-            chat_history = load_history_from_file(session_id)
-            
-            # Initialize inputs with chat history and new user goal
-            inputs = {
-                "input": goal,
-                "chat_history": chat_history,
-                "intermediate_steps": []
-            }
-            
-            # Run the graph
-            final_output = app_graph.invoke(inputs)
-
-            # Extract the final answer
-            if final_output['intermediate_steps']:
-                final_message = final_output['intermediate_steps'][-1]
-                final_text = final_message.content if hasattr(final_message, 'content') else str(final_message)
-            else:
-                final_text = "No response generated"
-            
-            # Update chat history with new interaction
-            updated_history = chat_history + [
-                HumanMessage(content=goal),
-                AIMessage(content=final_text)
-            ]
-            
-            # Save updated history
-            save_history_to_file(session_id, updated_history)
-            
-            # Create a structured log for the frontend
-            current_time = datetime.now().strftime("%H:%M:%S") # My Comment: Use Python's datetime for a timestamp
-            
-            simulated_log = [
-                {"id": "log-1", "type": "goal", "text": f"Goal received: \"{goal}\"", "timestamp": current_time},
-                {"id": "log-2", "type": "status", "text": "Agent is processing...", "timestamp": current_time},
-                {"id": "log-3", "type": "result", "text": final_text, "details": "Agent execution completed", "timestamp": current_time},
-            ]
-            
-            result = {
-                "message": "Agent execution complete.",
-                "log": simulated_log,
-                "session_id": session_id,
-                "history_length": len(updated_history)
-            }
-            
-            print(json.dumps(result))
+            result = run_agent(goal, session_id)
+            sys.stdout.buffer.write(orjson.dumps(result) + b"\n")
             
         except Exception as e:
             error_result = {
                 "error": str(e),
                 "message": "Agent execution failed"
             }
-            print(json.dumps(error_result), file=sys.stderr)
+            print(orjson.dumps(error_result).decode(), file=sys.stderr)
             sys.exit(1)
     
     elif operation == "get_history":
@@ -225,20 +344,7 @@ if __name__ == "__main__":
             sys.exit(1)
             
         session_id = sys.argv[2]
-        history = load_history_from_file(session_id)
-        
-        history_data = []
-        for msg in history:
-            if isinstance(msg, HumanMessage):
-                history_data.append({"type": "human", "content": msg.content})
-            elif isinstance(msg, AIMessage):
-                history_data.append({"type": "ai", "content": msg.content})
-        
-        result = {
-            "session_id": session_id,
-            "history": history_data
-        }
-        print(json.dumps(result))
+        sys.stdout.buffer.write(orjson.dumps(get_history(session_id)) + b"\n")
         
     elif operation == "clear_history":
         if len(sys.argv) < 3:
@@ -246,16 +352,7 @@ if __name__ == "__main__":
             sys.exit(1)
             
         session_id = sys.argv[2]
-        history_file = f"chat_history_{session_id}.json"
-        
-        if os.path.exists(history_file):
-            os.remove(history_file)
-            
-        result = {
-            "message": f"History cleared for session {session_id}",
-            "session_id": session_id
-        }
-        print(json.dumps(result))
+        sys.stdout.buffer.write(orjson.dumps(clear_history(session_id)) + b"\n")
         
     else:
         print(f"Unknown operation: {operation}", file=sys.stderr)
@@ -0,0 +1,119 @@
+# backend/python_scripts/python_worker.py
+
+# Long-lived Python worker for the Node.js backend.
+# Importing the handler modules once keeps the embedding model, the ChromaDB client and the
+# compiled LangGraph graph warm, instead of paying the interpreter + import cold start per request.
+# chroma_handler is loaded by the startup hook rather than at module import, keeping this module cheap
+# to import in the chunking pool's workers, which each re-import it. The agent and knowledge graph
+# modules are imported on first use, so a missing Gemini/Tavily key only fails those routes instead
+# of upload and QA as well.
+# Usage: python python_worker.py [--host 127.0.0.1] [--port 8001] [--workers 1]
+# Run it from the backend root so relative paths (./chroma_db, chat history) match the CLI scripts.
+
+import argparse
+from typing import List, Optional
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+# orjson serializes the (potentially large) result payloads several times faster than stdlib json
+app = FastAPI(title="CortexHub Python Worker", default_response_class=ORJSONResponse)
+
+# --- Request bodies ---
+class EmbedRequest(BaseModel):
+    file_path: str
+    file_type: str
+    document_id: str
+
+class QueryRequest(BaseModel):
+    query: str
+    document_ids: List[str] = []
+    k: int = 4
+
+class BatchQueryItem(BaseModel):
+    query: str
+    document_ids: List[str] = []
+    k: Optional[int] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: List[BatchQueryItem]
+    k: int = 4
+
+class RunAgentRequest(BaseModel):
+    goal: str
+    session_id: str = "default_session"
+
+class GenerateGraphRequest(BaseModel):
+    context: str
+
+@app.on_event("startup")
+def load_handlers():
+    # Warm the embedding model and ChromaDB client before the first request
+    import chroma_handler
+
+# --- Endpoints ---
+# Handlers are plain `def` so FastAPI runs the blocking model/DB work in its thread pool.
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.post("/embed")
+def embed(request: EmbedRequest):
+    import chroma_handler
+    try:
+        result_id = chroma_handler.embed_and_store_document(request.file_path, request.file_type, request.document_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Embedding process failed: {e}")
+    if not result_id:
+        raise HTTPException(status_code=422, detail="Embedding failed (no chunks extracted from document)")
+    return {"document_id": result_id}
+
+@app.post("/query")
+def query(request: QueryRequest):
+    import chroma_handler
+    try:
+        return chroma_handler.query_documents(request.query, request.document_ids, request.k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query process failed: {e}")
+
+@app.post("/query_batch")
+def query_batch(request: BatchQueryRequest):
+    # Items without their own k fall back to the request-level k
+    queries = [item.dict(exclude_none=True) for item in request.queries]
+    import chroma_handler
+    try:
+        return chroma_handler.query_documents_batch(queries, request.k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch query process failed: {e}")
+
+@app.post("/run_agent")
+def run_agent(request: RunAgentRequest):
+    try:
+        import langgraph_agent
+        return langgraph_agent.run_agent(request.goal, request.session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Agent execution failed: {e}")
+
+@app.post("/generate_graph")
+def generate_graph(request: GenerateGraphRequest):
+    try:
+        import knowledge_graph_generator
+        return knowledge_graph_generator.generate_graph(request.context)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate knowledge graph: {e}")
+
+# --- Main execution block ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the CortexHub Python operations over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1, help="Number of preloaded worker processes")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Multiple workers need an import string; each process loads its own copy of the models
+        uvicorn.run("python_worker:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,5 @@
+# The scripts import each other as top-level modules (they are run from python_scripts/), so do the same here
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,96 @@
+# Run from python_scripts/: python -m pytest tests
+
+import numpy as np
+import pytest
+
+@pytest.fixture(scope="module")
+def chroma_handler(tmp_path_factory):
+    """Imports chroma_handler with its Chroma store and embedding cache in a temporary directory."""
+    pytest.importorskip("chromadb")
+    pytest.importorskip("sentence_transformers")
+    workdir = tmp_path_factory.mktemp("chroma")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(workdir) # PersistentClient opens ./chroma_db
+        mp.setenv("EMBEDDING_CACHE_DIR", str(workdir / "embedding_cache"))
+        mp.delenv("CHROMA_SERVER_HOST", raising=False)
+        try:
+            import chroma_handler
+        except SystemExit:
+            pytest.skip("chroma_handler could not initialize (is the embedding model available?)")
+        yield chroma_handler
+
+class FakeCollection:
+    """Records query() calls and answers each query vector with a document naming it and the k used."""
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query_embeddings, n_results, where, include):
+        self.calls.append((where, n_results, len(query_embeddings)))
+        return {
+            "documents": [[f"q{int(embedding[0])}-k{n_results}"] for embedding in query_embeddings],
+            "metadatas": [[{"filename": "doc.pdf", "page": 1}] for _ in query_embeddings],
+        }
+
+def _fake_embed(texts):
+    # "query 3" -> [3.0, 0.0], so the fake collection can tell which query a vector came from
+    return np.array([[float(text.split()[-1]), 0.0] for text in texts])
+
+@pytest.fixture
+def collection(chroma_handler, monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(chroma_handler, "get_or_create_collection", lambda: collection)
+    monkeypatch.setattr(chroma_handler, "embed_texts", _fake_embed)
+    return collection
+
+def test_query_documents_batch_groups_queries_and_keeps_input_order(chroma_handler, collection):
+    queries = [
+        {"query": "query 0", "document_ids": ["b", "a"]},
+        {"query": "query 1", "document_ids": [], "k": 2},
+        {"query": "query 2", "document_ids": ["a", "b"], "k": None},
+        {"query": "query 3", "document_ids": ["a"]},
+        {"query": "query 4"},
+        {"query": "query 5", "document_ids": ["a", "b"], "k": 2},
+    ]
+    results = chroma_handler.query_documents_batch(queries, k=4)
+
+    assert [result[0]["text"] for result in results] == ["q0-k4", "q1-k2", "q2-k4", "q3-k4", "q4-k4", "q5-k2"]
+    assert all(result[0]["source"] == "doc.pdf (Page 1)" for result in results)
+    # One Chroma call per (document_ids, k) group; document_ids order does not matter and null k means the default
+    in_a_b = {"document_id": {"$in": ["a", "b"]}}
+    assert collection.calls == [
+        (in_a_b, 4, 2),
+        (None, 2, 1),
+        ({"document_id": "a"}, 4, 1),
+        (None, 4, 1),
+        (in_a_b, 2, 1),
+    ]
+
+def test_query_documents_batch_without_queries(chroma_handler, collection):
+    assert chroma_handler.query_documents_batch([], k=4) == []
+    assert collection.calls == []
+
+def test_query_documents_uses_precomputed_query_embedding(chroma_handler, collection):
+    results = chroma_handler.query_documents("query 7", ["a"], k=3)
+    assert results == [{"text": "q7-k3", "source": "doc.pdf (Page 1)"}]
+    assert collection.calls == [({"document_id": "a"}, 3, 1)]
+
+def test_load_docx_keeps_tables_in_reading_order(chroma_handler, tmp_path):
+    import docx
+
+    word_document = docx.Document()
+    word_document.add_paragraph("Intro")
+    table = word_document.add_table(rows=2, cols=2)
+    table.cell(0, 0).text, table.cell(0, 1).text = "Name", "Value"
+    table.cell(1, 0).text = "alpha"
+    word_document.add_paragraph("")
+    word_document.add_paragraph("Outro")
+    word_document.save(tmp_path / "sample.docx")
+
+    documents = chroma_handler._load_docx(str(tmp_path / "sample.docx"))
+    assert [(document.page_content, document.metadata) for document in documents] == [
+        ("Intro", {"para": 0}),
+        ("Name | Value", {"table": 0, "row": 0}),
+        ("alpha", {"table": 0, "row": 1}),
+        ("Outro", {"para": 2}),
+    ]
@@ -0,0 +1,165 @@
+# Run from python_scripts/: python -m pytest tests
+
+import asyncio
+import sqlite3
+import threading
+
+import orjson
+import pytest
+
+@pytest.fixture(scope="module")
+def agent(tmp_path_factory):
+    """Imports langgraph_agent with placeholder API keys and its chat history database in a temporary directory."""
+    for module in ("langgraph", "langchain_google_genai", "langchain_tavily"):
+        pytest.importorskip(module)
+    workdir = tmp_path_factory.mktemp("agent")
+    with pytest.MonkeyPatch.context() as mp:
+        # Nothing here calls Gemini or Tavily; the keys only have to be present
+        mp.setenv("GEMINI_API_KEY", "test-key")
+        mp.setenv("TAVILY_API_KEY", "test-key")
+        mp.setenv("CHAT_HISTORY_DB", str(workdir / "chat_history.db"))
+        mp.delenv("LLM_CACHE_PATH", raising=False)
+        import langgraph_agent
+        yield langgraph_agent
+
+# --- call_tools ---
+
+@pytest.fixture
+def searches(agent, monkeypatch):
+    """Replaces the Tavily call; records every query sent and fails the first search for "flaky ..." queries."""
+    calls = []
+
+    def fake_search(query_json):
+        query = orjson.loads(query_json)["query"]
+        calls.append(query)
+        if query.startswith("flaky") and calls.count(query) == 1:
+            return {"error": "timeout"}
+        return {"results": [query]}
+
+    monkeypatch.setattr(agent, "_tavily_search", fake_search)
+    return calls
+
+def _call_tools(agent, search_results, *queries):
+    """Runs the tool node for one model step requesting the given searches; returns the tool message contents."""
+    from langchain_core.messages import AIMessage
+
+    tool_calls = [{"name": "tavily_search", "args": {"query": query}, "id": f"call-{i}"} for i, query in enumerate(queries)]
+    state = {
+        "intermediate_steps": [AIMessage(content="", tool_calls=tool_calls)],
+        "search_results": search_results,
+    }
+    messages = asyncio.run(agent.call_tools(state))["intermediate_steps"]
+    assert [message.tool_call_id for message in messages] == [tool_call["id"] for tool_call in tool_calls]
+    return [message.content for message in messages]
+
+def test_call_tools_dedupes_searches_within_a_run(agent, searches):
+    search_results = {}
+    assert _call_tools(agent, search_results, "a", "b", "a") == [str({"results": [q]}) for q in ("a", "b", "a")]
+    assert _call_tools(agent, search_results, "b", "c") == [str({"results": [q]}) for q in ("b", "c")]
+    assert searches == ["a", "b", "c"]
+
+    # A new run starts from an empty cache and searches again
+    _call_tools(agent, {}, "a")
+    assert searches == ["a", "b", "c", "a"]
+
+def test_call_tools_never_caches_failed_searches(agent, searches):
+    search_results = {}
+    assert _call_tools(agent, search_results, "flaky news") == [str({"error": "timeout"})]
+    assert search_results == {}
+    assert _call_tools(agent, search_results, "flaky news") == [str({"results": ["flaky news"]})]
+    assert _call_tools(agent, search_results, "flaky news") == [str({"results": ["flaky news"]})]
+    assert searches == ["flaky news", "flaky news"]
+
+# --- Chat history ---
+
+@pytest.fixture
+def legacy_dir(tmp_path, monkeypatch):
+    """Working directory for pre-SQLite chat_history_<session>.json files, which are resolved relative to it."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+def _write_legacy(directory, session_id, history):
+    path = directory / f"chat_history_{session_id}.json"
+    path.write_bytes(orjson.dumps(history))
+    return path
+
+def _messages(agent, session_id):
+    return [(type(message).__name__, message.content) for message in agent.load_history(session_id)]
+
+def _row_count(agent, session_id):
+    return agent._HISTORY_DB.execute("SELECT COUNT(*) FROM msg WHERE session = ?", (session_id,)).fetchone()[0]
+
+LEGACY_HISTORY = [
+    {"type": "human", "content": "hi"},
+    {"type": "ai", "content": "hello"},
+    {"type": "system", "content": "not imported"},
+    {"type": "human", "content": "bye"},
+]
+IMPORTED = [("HumanMessage", "hi"), ("AIMessage", "hello"), ("HumanMessage", "bye")]
+
+def test_legacy_history_is_imported_once_and_file_removed(agent, legacy_dir):
+    path = _write_legacy(legacy_dir, "import", LEGACY_HISTORY)
+    assert _messages(agent, "import") == IMPORTED
+    assert not path.exists()
+    assert _messages(agent, "import") == IMPORTED
+
+def test_concurrent_loads_import_legacy_history_once(agent, legacy_dir):
+    path = _write_legacy(legacy_dir, "concurrent", LEGACY_HISTORY)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(_messages(agent, "concurrent"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [IMPORTED] * 8
+    assert _row_count(agent, "concurrent") == len(IMPORTED)
+    assert not path.exists()
+
+def test_failed_legacy_import_rolls_back_and_keeps_file(agent, legacy_dir, monkeypatch):
+    path = _write_legacy(legacy_dir, "rollback", LEGACY_HISTORY)
+    insert_messages = agent._insert_messages
+
+    def failing_insert(session_id, messages):
+        insert_messages(session_id, messages[:1]) # Partially written before the failure
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(agent, "_insert_messages", failing_insert)
+    assert agent.load_history("rollback") == []
+    assert _row_count(agent, "rollback") == 0
+    assert path.exists()
+
+    # The file is still there, so the next load imports it
+    monkeypatch.setattr(agent, "_insert_messages", insert_messages)
+    assert _messages(agent, "rollback") == IMPORTED
+    assert not path.exists()
+
+def test_stale_legacy_file_is_not_imported_over_existing_history(agent, legacy_dir):
+    from langchain_core.messages import HumanMessage
+
+    # Another worker process already imported this session (and appended to it) before the file was removed
+    agent.append_history("stale", [HumanMessage(content="already here")])
+    path = _write_legacy(legacy_dir, "stale", LEGACY_HISTORY)
+    assert _messages(agent, "stale") == [("HumanMessage", "already here")]
+    assert not path.exists()
+
+def test_append_history_keeps_order_and_skips_other_messages(agent, legacy_dir):
+    from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+    agent.append_history("append", [HumanMessage(content="q1"), AIMessage(content="a1")])
+    agent.append_history("append", [HumanMessage(content="q2"), ToolMessage(content="tool", tool_call_id="x"), AIMessage(content="a2")])
+    assert _messages(agent, "append") == [("HumanMessage", "q1"), ("AIMessage", "a1"), ("HumanMessage", "q2"), ("AIMessage", "a2")]
+    indexes = agent._HISTORY_DB.execute("SELECT idx FROM msg WHERE session = ? ORDER BY idx", ("append",)).fetchall()
+    assert [idx for (idx,) in indexes] == [0, 1, 2, 3]
+
+def test_clear_history_removes_rows_and_legacy_file(agent, legacy_dir):
+    from langchain_core.messages import HumanMessage
+
+    agent.append_history("clear", [HumanMessage(content="gone")])
+    agent.append_history("kept", [HumanMessage(content="stays")])
+    path = _write_legacy(legacy_dir, "clear", LEGACY_HISTORY)
+
+    agent.clear_history("clear")
+    assert _row_count(agent, "clear") == 0
+    assert not path.exists()
+    assert _messages(agent, "kept") == [("HumanMessage", "stays")]
+    agent.clear_history("clear") # Nothing left to delete
@@ -0,0 +1,72 @@
+# Run from python_scripts/: python -m pytest tests
+
+import random
+
+import pytest
+
+from text_chunkers import binary_split_spans, binary_split_text, fast_split_spans, fast_split_text
+
+CHUNKERS = [
+    pytest.param(binary_split_spans, binary_split_text, id="binary"),
+    pytest.param(fast_split_spans, fast_split_text, id="numba"),
+]
+
+def _prose(seed: int, words: int = 3000, alphabet: str = "abcdefghijklmnopqrstuvwxyz") -> str:
+    """Random words of 1-12 letters separated by spaces, sentence breaks, newlines and paragraph breaks."""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(words):
+        parts.append("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))))
+        parts.append(rng.choices([" ", ". ", "\n", "\n\n"], weights=[85, 8, 5, 2])[0])
+    return "".join(parts)
+
+SAMPLES = {
+    "prose": _prose(0),
+    "cjk": _prose(1, alphabet="文字列分割検索埋込向量知識图谱한국어"),
+    "emoji": _prose(2, alphabet="ab🙂🚀é́"),
+    "no_delimiters": "x" * 5432,
+    "no_delimiters_cjk": "漢" * 5432,
+    "short": "A single short sentence.",
+    "whitespace": " \n\n \t \n",
+    "empty": "",
+}
+
+def _assert_valid(text, spans, chunks, chunk_size):
+    assert all(chunk and chunk == chunk.strip() for chunk in chunks)
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    assert all(0 <= start < end <= len(text) and end - start <= chunk_size for start, end in spans)
+    # Every non-whitespace character ends up in at least one chunk
+    covered = [False] * len(text)
+    for start, end in spans:
+        covered[start:end] = [True] * (end - start)
+    assert all(covered[i] for i, char in enumerate(text) if not char.isspace())
+    # Chunks are the stripped, non-empty span slices, in document order
+    assert chunks == [text[start:end].strip() for start, end in spans if text[start:end].strip()]
+
+@pytest.mark.parametrize("split_spans, split_text", CHUNKERS)
+@pytest.mark.parametrize("name", SAMPLES)
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(1000, 200), (100, 0), (50, 49)])
+def test_chunk_invariants(split_spans, split_text, name, chunk_size, chunk_overlap):
+    text = SAMPLES[name]
+    spans = split_spans(text, chunk_size, chunk_overlap)
+    chunks = split_text(text, chunk_size, chunk_overlap)
+    _assert_valid(text, spans, chunks, chunk_size)
+    if text.strip():
+        assert chunks
+    else:
+        assert chunks == []
+
+@pytest.mark.parametrize("split_spans, split_text", CHUNKERS)
+def test_sizes_are_measured_in_characters(split_spans, split_text):
+    # Multi-byte scripts must get the same chunk lengths as ASCII, not a third of them
+    for name in ("no_delimiters", "no_delimiters_cjk"):
+        chunks = split_text(SAMPLES[name], 1000, 200)
+        assert max(len(chunk) for chunk in chunks) >= 800, name
+
+def test_fast_split_prefers_paragraph_breaks():
+    text = "a" * 600 + "\n\n" + "b" * 300 + " " + "c" * 300
+    assert fast_split_text(text, 1000, 200)[0] == "a" * 600
+
+def test_fast_split_rejects_overlap_not_smaller_than_size():
+    with pytest.raises(ValueError):
+        fast_split_text("text", 100, 100)
@@ -0,0 +1,130 @@
+# backend/python_scripts/text_chunkers.py
+
+# Offset-based text chunkers used by chroma_handler.py as alternatives to LangChain's
+# RecursiveCharacterTextSplitter. They work on index ranges of the original string and
+# slice each chunk out exactly once, instead of repeatedly splitting and re-joining text.
+
+import bisect
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError: # numba is optional; find_splits then runs as plain (slow) Python
+    njit = None
+
+# Coarsest to finest boundaries tried when a range is still larger than the chunk budget
+BINARY_SEPARATORS = ("\n\n", "\n", " ")
+
+def _split_range(text: str, start: int, end: int, separators: tuple, budget: int, ranges: list):
+    """Appends (start, end) ranges of at most `budget` chars covering text[start:end]."""
+    if end - start <= budget:
+        if end > start and not text[start:end].isspace():
+            ranges.append((start, end))
+        return
+    if not separators:
+        # No boundary left to cut on: fall back to fixed-size windows
+        for window_start in range(start, end, budget):
+            ranges.append((window_start, min(window_start + budget, end)))
+        return
+
+    # Unit offsets for this separator; unit i spans unit_starts[i]:unit_ends[i]
+    separator = separators[0]
+    unit_starts, unit_ends = [start], []
+    position = text.find(separator, start, end)
+    while position != -1:
+        unit_ends.append(position)
+        unit_starts.append(position + len(separator))
+        position = text.find(separator, position + len(separator), end)
+    unit_ends.append(end)
+
+    if len(unit_starts) == 1:
+        _split_range(text, start, end, separators[1:], budget, ranges)
+    else:
+        _bisect_units(text, unit_starts, unit_ends, 0, len(unit_starts), separators[1:], budget, ranges)
+
+def _bisect_units(text: str, unit_starts: list, unit_ends: list, lo: int, hi: int, separators: tuple, budget: int, ranges: list):
+    """Recursively halves units[lo:hi] (by character count) until every half fits the budget."""
+    start, end = unit_starts[lo], unit_ends[hi - 1]
+    if end - start <= budget or hi - lo == 1:
+        # Fits, or a single unit that is still too long and must be cut on a finer separator
+        _split_range(text, start, end, separators, budget, ranges)
+        return
+    middle = min(max(bisect.bisect_left(unit_starts, (start + end) // 2, lo + 1, hi), lo + 1), hi - 1)
+    _bisect_units(text, unit_starts, unit_ends, lo, middle, separators, budget, ranges)
+    _bisect_units(text, unit_starts, unit_ends, middle, hi, separators, budget, ranges)
+
+def binary_split_spans(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[tuple[int, int]]:
+    """Returns the (start, end) char offsets of the chunks produced by binary_split_text (before stripping)."""
+    budget = max(chunk_size - chunk_overlap, 1)
+    ranges = []
+    _split_range(text, 0, len(text), BINARY_SEPARATORS, budget, ranges)
+    return [(max(start - chunk_overlap, 0) if i else start, end) for i, (start, end) in enumerate(ranges)]
+
+def binary_split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[str]:
+    """Splits text with a binary recursive chunker over paragraph (then line, then word) offsets.
+
+    Chunks are non-overlapping ranges of at most chunk_size - chunk_overlap chars; each chunk after
+    the first is then extended backwards by chunk_overlap chars, so no chunk exceeds chunk_size.
+    """
+    chunks = (text[start:end].strip() for start, end in binary_split_spans(text, chunk_size, chunk_overlap))
+    return [chunk for chunk in chunks if chunk]
+
+# Code point -> delimiter rank for find_splits (lower is a better split point, 255 is "not a delimiter";
+# code points past the table are never delimiters).
+# "\n\n" (rank 0) is detected in the scan as a newline that follows another newline.
+DELIMITER_RANKS = np.full(256, 255, dtype=np.uint8)
+DELIMITER_RANKS[ord("\n")] = 1
+DELIMITER_RANKS[ord(".")] = 2
+DELIMITER_RANKS[ord(" ")] = 3
+
+def _find_splits(buf, delim_ranks, chunk_size, overlap):
+    """Scans code points once and returns (start, end) char spans of at most chunk_size chars."""
+    n = buf.shape[0]
+    spans = []
+    start = 0
+    while start < n:
+        limit = start + chunk_size
+        if limit >= n:
+            spans.append((start, n))
+            break
+
+        # Cut after the best-ranked (then latest) delimiter in the window, or hard cut at the limit if there is
+        # none. Only positions past start + overlap are considered, so the next chunk always starts after this one did.
+        best_rank = 255
+        end = limit
+        for i in range(start + overlap, limit):
+            rank = delim_ranks[buf[i]] if buf[i] < delim_ranks.shape[0] else 255
+            if rank == 1 and i > 0 and buf[i - 1] == 10:
+                rank = 0
+            if rank != 255 and rank <= best_rank:
+                best_rank = rank
+                end = i + 1
+        spans.append((start, end))
+
+        # Overlap: restart `overlap` chars back, moved forward to just after the next space or newline
+        next_start = end
+        for i in range(end - overlap, end - 1):
+            if buf[i] == 10 or buf[i] == 32:
+                next_start = i + 1
+                break
+        start = next_start
+    return spans
+
+find_splits = njit(cache=True)(_find_splits) if njit is not None else _find_splits
+NUMBA_AVAILABLE = njit is not None
+
+def fast_split_spans(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[tuple[int, int]]:
+    """Returns the (start, end) char offsets of the chunks produced by fast_split_text (before stripping)."""
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    if not text:
+        return []
+    # UTF-32 gives one array element per character, so sizes and offsets are in characters (as for the
+    # other splitters) whatever the script, and the spans slice the str directly
+    buf = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    return [(int(start), int(end)) for start, end in find_splits(buf, DELIMITER_RANKS, chunk_size, chunk_overlap)]
+
+def fast_split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[str]:
+    """Splits text with the delimiter scan in find_splits (JIT-compiled when numba is installed)."""
+    chunks = (text[start:end].strip() for start, end in fast_split_spans(text, chunk_size, chunk_overlap))
+    return [chunk for chunk in chunks if chunk]
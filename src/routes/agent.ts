@@ -1,6 +1,5 @@
 import { Router, Request, Response } from 'express';
-import { runPythonScript } from '../server'; // Import the helper function from server.ts
-import path from 'path';
+import { callPythonWorker } from '../server'; // Import the helper function from server.ts
 
 const router = Router();
 
@@ -14,12 +13,8 @@ router.post('/run', async (req: Request, res: Response) => {
   }
 
   try {
-    const pythonScriptPath = path.join(__dirname, '../../python_scripts/langgraph_agent.py');
-    const pythonArgs = ['run_agent', goal, 'default_session'];
-    
-    // The Python script will return a JSON object with a log array
-    const pythonOutput = await runPythonScript(pythonScriptPath, pythonArgs);
-    const result = JSON.parse(pythonOutput);
+    // The Python worker returns a JSON object with a log array
+    const result = await callPythonWorker('/run_agent', { goal, session_id: 'default_session' });
 
     res.status(200).json(result);
   } catch (error: any) {
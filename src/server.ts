@@ -6,7 +6,7 @@ dotenv.config();
 import express, { Request, Response } from "express";
 import cors from "cors";
 import multer from "multer";
-import { spawn } from "child_process";
+import http from "http";
 import path from "path";
 import fs from "fs"; // Import fs for file system operations
 
@@ -87,40 +87,69 @@ const storage = multer.diskStorage({
 });
 const upload = multer({ storage: storage });
 
-// --- Helper function to run Python script ---
-export const runPythonScript = (
-  scriptPath: string,
-  args: string[]
-): Promise<string> => {
+// --- Helper function to call the long-lived Python worker ---
+// The worker (python_scripts/python_worker.py) keeps models and the ChromaDB client loaded,
+// avoiding the interpreter + import cold start of spawning a Python process per call.
+const PYTHON_WORKER_URL = process.env.PYTHON_WORKER_URL || "http://127.0.0.1:8001";
+// Idle timeout for a worker call; 0 (default) waits indefinitely, since embedding a large upload can take
+// many minutes before the worker sends its response headers. Uses node:http rather than fetch because
+// undici's built-in fetch aborts any request whose headers have not arrived after 300 seconds.
+const PYTHON_WORKER_TIMEOUT_MS = Number(process.env.PYTHON_WORKER_TIMEOUT_MS || 0);
+
+export const callPythonWorker = <T = any>(
+  endpoint: string,
+  payload: Record<string, unknown>
+): Promise<T> => {
   return new Promise((resolve, reject) => {
-    const pythonProcess = spawn("python", [scriptPath, ...args]);
-
-    let stdout = "";
-    let stderr = "";
-
-    pythonProcess.stdout.on("data", (data) => {
-      stdout += data.toString();
-    });
-
-    pythonProcess.stderr.on("data", (data) => {
-      stderr += data.toString();
-    });
-
-    pythonProcess.on("close", (code) => {
-      if (code === 0) {
-        resolve(stdout.trim());
-      } else {
-        reject(
-          new Error(
-            `Python script exited with code ${code}. Stderr: ${stderr.trim()}`
-          )
-        );
+    const url = new URL(`${PYTHON_WORKER_URL}${endpoint}`);
+    const requestBody = JSON.stringify(payload);
+
+    const request = http.request(
+      url,
+      {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          "Content-Length": Buffer.byteLength(requestBody),
+        },
+        timeout: PYTHON_WORKER_TIMEOUT_MS || undefined,
+      },
+      (response) => {
+        let data = "";
+        response.setEncoding("utf8");
+        response.on("data", (chunk) => {
+          data += chunk;
+        });
+        response.on("error", reject);
+        response.on("end", () => {
+          let body: any = {};
+          try {
+            body = data ? JSON.parse(data) : {};
+          } catch {
+            body = { detail: data };
+          }
+          const status = response.statusCode ?? 0;
+          if (status < 200 || status >= 300) {
+            reject(
+              new Error(
+                `Python worker ${endpoint} failed with status ${status}: ${body.detail ?? JSON.stringify(body)}`
+              )
+            );
+            return;
+          }
+          resolve(body as T);
+        });
       }
-    });
+    );
 
-    pythonProcess.on("error", (err) => {
-      reject(new Error(`Failed to start Python script: ${err.message}`));
+    request.on("timeout", () => {
+      reject(new Error(`Python worker ${endpoint} timed out after ${PYTHON_WORKER_TIMEOUT_MS} ms`));
+      request.destroy();
+    });
+    request.on("error", (err) => {
+      reject(new Error(`Failed to reach Python worker at ${PYTHON_WORKER_URL}: ${err.message}`));
     });
+    request.end(requestBody);
   });
 };
 
@@ -158,13 +187,8 @@ app.post('/api/generate-knowledge-graph',async(req:Request,res:Response)=>{
         return res.status(400).json({message:'Could not retrieve content'});
       }
 
-      // 3. Trigger the Python script to generate the knowledge graph
-      const pythonScriptPath=path.join(__dirname,'../python_scripts/knowledge_graph_generator.py');
-      const pythonArgs=['generate_graph',textContext];
-      const pythonOutput=await runPythonScript(pythonScriptPath,pythonArgs);
-
-      // 4. Parse the JSON output from the Python script
-      const knowledgeGraph=JSON.parse(pythonOutput);
+      // 3. Ask the Python worker to generate the knowledge graph
+      const knowledgeGraph=await callPythonWorker('/generate_graph',{context:textContext});
 
       res.status(200).json(knowledgeGraph);
   }catch(error:any){
@@ -202,24 +226,16 @@ app.post(
       await newDocument.save();
       const mongoDocumentId = (newDocument._id as any).toString(); // Convert to string explicitly
 
-      // 2. Trigger Python script to process and embed document
-      const pythonScriptPath = path.join(
-        __dirname,
-        "../python_scripts/chroma_handler.py"
-      );
-      const pythonArgs = [
-        "embed_document",
-        filePath,
-        mimetype,
-        mongoDocumentId,
-      ];
-
-      // The Python script will print "SUCCESS:document_id" or "FAILURE:error_message"
-      const pythonOutput = await runPythonScript(pythonScriptPath, pythonArgs);
-
-      const successMatch = pythonOutput.match(/SUCCESS:(.+)$/m);
-      if (successMatch) {
-        const chromaDocId = successMatch[1].trim();
+      // 2. Ask the Python worker to process and embed the document
+      // The worker responds with { document_id } or a non-2xx status carrying the error
+      const embedResult = await callPythonWorker<{ document_id?: string }>("/embed", {
+        file_path: filePath,
+        file_type: mimetype,
+        document_id: mongoDocumentId,
+      });
+
+      if (embedResult.document_id) {
+        const chromaDocId = embedResult.document_id;
         // 3. Update MongoDB document with ChromaDB ID
         newDocument.processed = true;
         newDocument.chromaDocumentId = chromaDocId;
@@ -232,7 +248,7 @@ app.post(
           chromaDocumentId: chromaDocId,
         });
       } else {
-        throw new Error(`Python processing failed: ${pythonOutput}`);
+        throw new Error(`Python processing failed: ${JSON.stringify(embedResult)}`);
       }
     } catch (error: any) {
       console.error("File upload and processing error:", error);
@@ -299,18 +315,11 @@ app.post("/api/universal-qa", async (req: Request, res: Response) => {
       }
     }
 
-    // 1. Trigger Python script to query ChromaDB for relevant chunks
-    const pythonScriptPath = path.join(
-      __dirname,
-      "../python_scripts/chroma_handler.py"
-    );
-    const queryArgs = ["query_documents", query, chromaDocumentIds.join(",")]; // Pass IDs as comma-separated string
-    const relevantChunksJson = await runPythonScript(
-      pythonScriptPath,
-      queryArgs
+    // 1. Ask the Python worker to query ChromaDB for relevant chunks
+    const relevantChunks = await callPythonWorker<{ text: string; source: string }[]>(
+      "/query",
+      { query, document_ids: chromaDocumentIds }
     );
-    // FIX: The Python script returns an array of objects, not strings.
-    const relevantChunks: { text: string; source: string }[] = JSON.parse(relevantChunksJson);
 
     if (relevantChunks.length === 0) {
       return res.status(200).json({